@@ -0,0 +1,49 @@
+"""
+Startup-time benchmark for the analyze_dblp command-line program.
+
+Runs each command in a fresh interpreter several times and reports the
+fastest and median wall-clock times. `--help` and invalid-argument runs
+should cost about as much as a bare interpreter, well under the time it
+takes to import pandas and scipy.stats.
+
+usage: python benchmarks/startup.py [repeat]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+script = os.path.join(root, "top_k_insights", "analyze_dblp.py")
+
+commands = [
+    ("bare interpreter", [sys.executable, "-c", "pass"]),
+    ("import pandas, scipy.stats", [sys.executable, "-c", "import pandas, scipy.stats"]),
+    ("analyze_dblp.py --help", [sys.executable, script, "--help"]),
+    ("analyze_dblp.py invalid args", [sys.executable, script, "papers", "3", "10"]),
+    ("python -m top_k_insights.analyze_dblp --help",
+     [sys.executable, "-m", "top_k_insights.analyze_dblp", "--help"]),
+]
+
+
+def time_command(command, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print("%-46s %10s %10s" % ("command", "min (s)", "median (s)"))
+    for name, command in commands:
+        best, median = time_command(command, repeat)
+        print("%-46s %10.3f %10.3f" % (name, best, median))
+
+
+if __name__ == "__main__":
+    main()
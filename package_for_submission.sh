@@ -4,18 +4,29 @@ mkdir -p submission/report/notebooks/
 mkdir -p submission/data/
 mkdir -p submission/log/
 mkdir -p submission/tests/
+mkdir -p submission/benchmarks/
 
 cp README.md submission/README.md 
 cp requirements.txt submission/requirements.txt 
+cp pyproject.toml submission/pyproject.toml 
 cp top_k_insights/__init__.py submission/top_k_insights/__init__.py 
 cp top_k_insights/analyze_dblp.py submission/top_k_insights/analyze_dblp.py 
+cp top_k_insights/batch.py submission/top_k_insights/batch.py 
+cp top_k_insights/export.py submission/top_k_insights/export.py 
 cp top_k_insights/insight_extractor.py submission/top_k_insights/insight_extractor.py 
 cp top_k_insights/significance_tests.py submission/top_k_insights/significance_tests.py 
 cp data/papers-query.sql submission/data/papers-query.sql 
 cp data/paperauths-query.sql submission/data/paperauths-query.sql 
 cp data/all-paperauths.csv submission/data/all-paperauths.csv 
 cp data/all-papers.csv submission/data/all-papers.csv 
+cp data/vehicle-sales.csv submission/data/vehicle-sales.csv 
+cp tests/conftest.py submission/tests/conftest.py 
 cp tests/test_sigtests.py submission/tests/test_sigtests.py 
+cp tests/test_insight_extractor.py submission/tests/test_insight_extractor.py 
+cp tests/test_export.py submission/tests/test_export.py 
+cp tests/test_batch.py submission/tests/test_batch.py 
+cp tests/test_startup.py submission/tests/test_startup.py 
+cp benchmarks/startup.py submission/benchmarks/startup.py 
 cp report/final-report.pdf submission/report/final-report.pdf 
 cp report/notebooks/*.pdf submission/report/notebooks/
 cp log/*.log submission/log/
@@ -0,0 +1,34 @@
+from top_k_insights.insight_extractor import InsightExtractor
+import pandas as pd
+import os
+import pytest
+
+
+@pytest.fixture
+def vehicle_sales():
+    """
+    Path to the small vehicle sales dataset shipped in data/.
+    """
+    return os.path.join(os.path.dirname(__file__), "..", "data", "vehicle-sales.csv")
+
+
+@pytest.fixture
+def make_extractor(vehicle_sales):
+    """
+    Factory for InsightExtractors over the vehicle sales dataset.
+    """
+    def make(**kwargs):
+        data = pd.read_csv(vehicle_sales, encoding="mac_roman")
+        return InsightExtractor(data, ["year", "brand", "country"], "vehicles", "sum", **kwargs)
+    return make
+
+
+@pytest.fixture
+def summary():
+    """
+    Compare top insights regardless of their ids, which depend on how many
+    insights were tested before.
+    """
+    def summarize(insights):
+        return sorted(insight.to_csv().split(";", 1)[1] for insight in insights)
+    return summarize
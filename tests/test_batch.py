@@ -0,0 +1,95 @@
+import top_k_insights.batch as batch
+from top_k_insights.insight_extractor import InsightExtractor
+import os
+import pytest
+
+
+def test_run_jobs_matches_separate_runs(vehicle_sales, summary):
+    jobs = batch.validate_jobs([
+        {"dataset": vehicle_sales, "depth": 1, "k": 3},
+        {"dataset": vehicle_sales, "depth": 2, "k": 5},
+        {"dataset": vehicle_sales, "depth": 2, "k": 2}])
+    results, timings = batch.run_jobs(jobs, encoding="mac_roman")
+
+    assert([source for (_, source) in timings] == ["computed", "computed", "from k=5"])
+
+    data, dimensions, measure, agg = batch.load_dataset(vehicle_sales, "mac_roman")
+    for job, top_insights in zip(jobs, results):
+        ie = InsightExtractor(data, dimensions, measure, agg)
+        expected = ie.extract_insights(job["depth"], job["k"])
+        assert(summary(top_insights) == summary(expected))
+
+
+def test_run_jobs_with_filters(vehicle_sales, summary):
+    jobs = batch.validate_jobs([{"dataset": vehicle_sales, "depth": 1, "k": 6, "filters": {"country": "Japan"}}])
+    results, _ = batch.run_jobs(jobs, encoding="mac_roman")
+
+    # Every insight is distinct and leaves the filtered dimension out
+    top_insights = results[0]
+    assert(len(set(summary(top_insights))) == len(top_insights))
+    assert(all("country" not in insight.subspace and insight.dimension != "country"
+               for insight in top_insights))
+
+
+def test_validate_jobs(vehicle_sales):
+    bad_jobs = [
+        [],
+        [{"dataset": vehicle_sales, "depth": 3, "k": 5}],
+        [{"dataset": vehicle_sales, "depth": 1, "k": 0}],
+        [{"dataset": vehicle_sales, "depth": 1, "k": 5, "filters": ["country"]}],
+        [{"dataset": vehicle_sales, "depth": 1, "k": 5, "filters": {"country": ["Japan"]}}]]
+    for jobs in bad_jobs:
+        with pytest.raises(ValueError):
+            batch.validate_jobs(jobs)
+
+    # Unknown filter dimensions are caught once the dataset is loaded
+    jobs = batch.validate_jobs([{"dataset": vehicle_sales, "depth": 1, "k": 5, "filters": {"colour": "red"}}])
+    with pytest.raises(ValueError):
+        batch.run_jobs(jobs, encoding="mac_roman")
+
+
+def test_run_jobs_rejects_empty_filters(vehicle_sales):
+    for filters in [{"country": "Atlantis"}, {"year": "2017"}]:
+        jobs = batch.validate_jobs([{"dataset": vehicle_sales, "depth": 1, "k": 5, "filters": filters}])
+        with pytest.raises(ValueError, match="Job 0"):
+            batch.run_jobs(jobs, encoding="mac_roman")
+
+
+@pytest.mark.parametrize("extension", ["jsonl", "parquet"])
+def test_batch_export(tmp_path, vehicle_sales, extension):
+    if extension == "parquet":
+        pytest.importorskip("pyarrow")
+    import pandas as pd
+    import json
+
+    path = str(tmp_path / ("insights." + extension))
+    config = {
+        "encoding": "mac_roman",
+        "export": path,
+        "jobs": [
+            {"dataset": vehicle_sales, "depth": 1, "k": 3},
+            {"dataset": vehicle_sales, "depth": 1, "k": 2, "filters": {"country": "Japan"}}]}
+    config_path = tmp_path / "jobs.json"
+    config_path.write_text(json.dumps(config))
+
+    # Run from tmp_path, where the log directory is created
+    cwd = os.getcwd()
+    os.chdir(str(tmp_path))
+    try:
+        batch.main([str(config_path)])
+    finally:
+        os.chdir(cwd)
+
+    if extension == "parquet":
+        exported = pd.read_parquet(path)
+    else:
+        exported = pd.read_json(path, lines=True)
+
+    # Every job is exported, and filtered jobs keep their filters
+    # in the exported subspace
+    run_ids = list(exported['run_id'])
+    assert(len(exported) == 5)
+    assert(sum("_job0_" in run_id for run_id in run_ids) == 3)
+    assert(sum("_job1_" in run_id for run_id in run_ids) == 2)
+    job1 = exported[exported['run_id'].str.contains("_job1_")]
+    assert(all(json.loads(subspace).get("country") == "Japan" for subspace in job1['subspace']))
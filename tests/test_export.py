@@ -0,0 +1,79 @@
+import top_k_insights.export as export
+import json
+import os
+import pytest
+
+
+@pytest.fixture
+def extract_insights(make_extractor):
+    def extract(depth, k):
+        return make_extractor(keep_result_sets=True).extract_insights(depth, k)
+    return extract
+
+
+def test_export_jsonl(tmp_path, extract_insights):
+    insights = extract_insights(1, 3)
+    path = str(tmp_path / "insights.jsonl")
+    result_set_path = str(tmp_path / "result_sets.jsonl")
+
+    # Two runs append to the same files
+    export.export_insights(insights, path, "run1", result_set_path=result_set_path)
+    export.export_insights(insights, path, "run2", result_set_path=result_set_path)
+
+    records = [json.loads(line) for line in open(path)]
+    assert([r['run_id'] for r in records] == ["run1"] * 3 + ["run2"] * 3)
+    assert([r['rank'] for r in records[:3]] == [1, 2, 3])
+    assert(list(records[0]) == export.insight_columns)
+    scores = [r['score'] for r in records[:3]]
+    assert(scores == sorted(scores, reverse=True))
+
+    # Result sets only keep the dimension and 'M' columns
+    rows = [json.loads(line) for line in open(result_set_path)]
+    assert(len(rows) == 2 * sum(len(insight.result_set) for insight in insights))
+    assert(list(rows[0]) == export.result_set_columns)
+    assert(sorted(json.loads(rows[0]['dimensions'])) == ["brand", "country", "year"])
+    assert({r['insight_id'] for r in rows} == {r['id'] for r in records})
+
+
+@pytest.mark.parametrize("filename", ["insights.parquet", "insights.feather"])
+def test_export_columnar(tmp_path, filename, extract_insights):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    insights = extract_insights(2, 3)
+    path = str(tmp_path / filename)
+    result_set_path = str(tmp_path / ("result_sets" + os.path.splitext(filename)[1]))
+    export.export_insights(insights, path, "run1", result_set_path=result_set_path)
+
+    read_table = pyarrow.parquet.read_table if filename.endswith(".parquet") else pyarrow.feather.read_table
+    table = read_table(path)
+    assert(table.schema.names == export.insight_columns)
+    assert(table.schema.field('score').type == pa.float64())
+    assert(table.schema.field('id').type == pa.int64())
+    assert(table.num_rows == 3)
+
+    result_sets = read_table(result_set_path)
+    assert(result_sets.schema.names == export.result_set_columns)
+    assert(result_sets.schema.field('M').type == pa.float64())
+    assert(result_sets.num_rows == sum(len(insight.result_set) for insight in insights))
+
+
+def test_guess_format():
+    assert(export.guess_format("out.ndjson") == "jsonl")
+    assert(export.guess_format("out.parquet") == "parquet")
+    assert(export.guess_format("out.feather") == "arrow")
+
+
+def test_export_result_sets_format(tmp_path, extract_insights):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    # Each file is written in the format of its own extension
+    path = str(tmp_path / "insights.jsonl")
+    result_set_path = str(tmp_path / "result_sets.parquet")
+    insights = extract_insights(1, 3)
+    export.export_insights(insights, path, "run1", result_set_path=result_set_path)
+
+    assert(len(open(path).readlines()) == 3)
+    assert(pyarrow.parquet.read_table(result_set_path).schema.names == export.result_set_columns)
@@ -0,0 +1,63 @@
+import top_k_insights.significance_tests as st
+import time
+import pytest
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_workers_match_serial(executor, make_extractor, summary):
+    for depth in [1, 2]:
+        expected = summary(make_extractor().extract_insights(depth, 5))
+        top_insights = make_extractor().extract_insights(depth, 5, workers=2, executor=executor,
+                                                         batch_size=3, queue_size=4)
+        assert(summary(top_insights) == expected)
+
+
+def test_worker_error_stops_search(monkeypatch, make_extractor):
+    def run_tests(*args):
+        raise RuntimeError("significance test failed")
+
+    monkeypatch.setattr(st, "run_tests", run_tests)
+
+    ie = make_extractor()
+    calls = []
+    enumerate_insight = ie.enumerate_insight
+    def counting_enumerate_insight(*args):
+        calls.append(args)
+        return enumerate_insight(*args)
+    ie.enumerate_insight = counting_enumerate_insight
+
+    start = time.time()
+    with pytest.raises(RuntimeError):
+        ie.extract_insights(2, 5, workers=1, batch_size=1, queue_size=1)
+
+    # The search stops soon after the first failed batch, rather than
+    # enumerating the whole (unpruned) search space first
+    assert(len(calls) < 500)
+    assert(time.time() - start < 10)
+
+
+def test_producer_error_is_raised(make_extractor):
+    ie = make_extractor()
+    def extract_result_set(*args):
+        raise KeyError("bad dimension")
+    ie.extract_result_set = extract_result_set
+
+    with pytest.raises(KeyError):
+        ie.extract_insights(1, 5, workers=2)
+
+
+def test_serial_search_after_pipelined_search(monkeypatch, make_extractor, summary):
+    ie = make_extractor()
+    expected = summary(ie.extract_insights(1, 5))
+    assert(summary(ie.extract_insights(1, 5, workers=2)) == expected)
+    assert(summary(ie.extract_insights(1, 5)) == expected)
+
+    # Also after a pipelined search that failed part way through
+    def run_tests(*args):
+        raise RuntimeError("significance test failed")
+
+    with monkeypatch.context() as m:
+        m.setattr(st, "run_tests", run_tests)
+        with pytest.raises(RuntimeError):
+            ie.extract_insights(1, 5, workers=1)
+    assert(summary(ie.extract_insights(1, 5)) == expected)
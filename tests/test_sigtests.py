@@ -53,3 +53,15 @@ def test_linear_negative_point():
     print(insight, "expected insight: {%0.2f} at x=%d" % (rs['M'][500], rs['year'][500]))
     print("significance score:", sig, "(expected: >", .9, ")")
     assert(sig > 0.9)
+
+def test_run_tests():
+    # ordinal dividing dimension gets both a point and a shape test
+    rs = pd.DataFrame(zip(range(100), [x + random.random() for x in range(0, 200, 2)]), columns=["year", "M"])
+    results = st.run_tests(rs, "year", 1, [("sum", "M")])
+    assert([r[0] for r in results] == ["point", "shape"])
+    assert([r[1] for r in results] == ["linear_point", "linear_shape"])
+
+    # categorical dividing dimension only gets a point test
+    rs = pd.DataFrame([10 * np.random.normal() + 15 for _ in range(100)], columns=['M'])
+    results = st.run_tests(rs, "brand", 2, [("sum", "M"), ("rank", "year")])
+    assert([r[1] for r in results] == ["normal"])
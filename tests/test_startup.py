@@ -0,0 +1,24 @@
+import subprocess
+import sys
+
+
+def test_cli_import_is_lightweight():
+    # Importing the command-line program, e.g. for --help, should not
+    # load pandas, numpy or scipy
+    code = ("import sys, top_k_insights.analyze_dblp; "
+            "print(sorted(m for m in ('pandas', 'numpy', 'scipy') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert(output.stdout.strip() == "[]")
+
+
+def test_cli_rejects_invalid_args():
+    output = subprocess.run([sys.executable, "-m", "top_k_insights.analyze_dblp", "papers", "3", "10"],
+                            capture_output=True, text=True)
+    assert(output.returncode == 2)
+
+
+def test_cli_rejects_bad_export_filename():
+    output = subprocess.run([sys.executable, "-m", "top_k_insights.analyze_dblp", "papers", "1", "10",
+                             "-export", "out.csv"], capture_output=True, text=True)
+    assert(output.returncode == 2)
+    assert("out.csv" in output.stderr)
@@ -1,5 +1,13 @@
-from insight_extractor import InsightExtractor, Insight
-import pandas as pd
+import os
+import sys
+
+# Allow running this file directly as a script, as well as through the
+# top-k-insights console script or `python -m top_k_insights.analyze_dblp`
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from top_k_insights.insight_extractor import InsightExtractor, Insight
+from top_k_insights.export import export_insights, guess_format
 
 import logging
 from datetime import datetime
@@ -7,14 +15,10 @@ import time
 import argparse
 
 
-# Log to file
-start = time.time()
-log_filename = datetime.now().strftime('log/topk_%m_%d_%H_%M_%S.log')
-logging.basicConfig(level=logging.INFO, filename=log_filename)
 bar = "*" * 60
 
 
-def main():
+def main(argv=None):
 
     # Parse input args
     parser = argparse.ArgumentParser(description='Extract Top Insights from DBLP')
@@ -22,37 +26,57 @@ def main():
     parser.add_argument('depth', type=int, help="1 or 2")
     parser.add_argument('k', type=int, help="1 to 100, integer")
     parser.add_argument('-encoding', type=str, help="dataset encoding; ('mac_roman' works on locally)")
-    args = parser.parse_args()
+    parser.add_argument('-workers', type=int, default=0, help="number of significance test workers; 0 runs everything on one thread")
+    parser.add_argument('-executor', type=str, default='thread', choices=['thread', 'process'], help="'thread' or 'process' significance test workers")
+    parser.add_argument('-export', type=str, help="write top insights to a .jsonl, .parquet or .arrow file")
+    parser.add_argument('-export_result_sets', type=str, help="write the result sets backing the top insights to this file, in the same format as -export")
+    parser.add_argument('-run_id', type=str, help="run id recorded in exported files; defaults to dataset, depth, k and a timestamp")
+    args = parser.parse_args(argv)
 
     # Validate input args
     if (args.dataset not in ['papers', 'collaborators']
         or args.depth not in [1, 2]
         or args.k < 1
         or args.k > 100):
-        parser.print_help()
-        parser.print_usage()
+        parser.error("expected dataset of papers or collaborators, depth of 1 or 2, and k from 1 to 100")
+    if args.export_result_sets and not args.export:
+        parser.error("-export_result_sets requires -export")
+
+    # Check export filenames now, rather than after a long search
+    for path in [args.export, args.export_result_sets]:
+        if path is not None:
+            try:
+                guess_format(path)
+            except ValueError:
+                parser.error("expected a .jsonl, .parquet or .arrow export filename, not %s" % path)
+
+    # Log to file. This happens after parsing arguments so that --help and
+    # invalid arguments return right away, without creating a log file.
+    start = time.time()
+    os.makedirs('log', exist_ok=True)
+    log_filename = datetime.now().strftime('log/topk_%m_%d_%H_%M_%S.log')
+    logging.basicConfig(level=logging.INFO, filename=log_filename)
 
     # Prepare for analysis
-    if args.dataset == 'papers':
-        filename = "./data/all-papers.csv"
-        data = pd.read_csv(filename, encoding=args.encoding, dtype = {'school': str})
-        dimensions = ['venue_name', 'year', 'school', 'venue_type']
-        measure = None
-        agg = 'count'
-    elif args.dataset == 'collaborators':
-        filename = "./data/all-paperauths.csv"
-        data = pd.read_csv(filename, encoding=args.encoding)
-        dimensions = ['paperid', 'authid', "year"]
-        measure = None
-        agg = 'count'
+    data, dimensions, measure, agg = load_dblp(args.dataset, args.encoding)
 
     # Extract insights
-    ie = InsightExtractor(data, dimensions, measure, agg)
-    top_insights = ie.extract_insights(depth=args.depth, k=args.k)
+    ie = InsightExtractor(data, dimensions, measure, agg,
+                          keep_result_sets=args.export_result_sets is not None)
+    top_insights = ie.extract_insights(depth=args.depth, k=args.k,
+                                       workers=args.workers, executor=args.executor)
 
     # Print results
     print_top_insights(top_insights)
 
+    # Export results
+    if args.export:
+        run_id = args.run_id or "%s_d%d_k%d_%s" % (
+            args.dataset, args.depth, args.k, datetime.now().strftime('%m_%d_%H_%M_%S'))
+        export_insights(top_insights, args.export, run_id,
+                        result_set_path=args.export_result_sets)
+        logging.info("Exported top insights to %s" % args.export)
+
     # Print running time
     end = time.time()
     print(bar)
@@ -60,6 +84,32 @@ def main():
     print(bar)
 
 
+def load_dblp(dataset, encoding=None):
+    """
+    Load the 'papers' or 'collaborators' DBLP dataset.
+    Returns a (data, dimensions, measure, agg) tuple of InsightExtractor args.
+    """
+    # pandas is only imported once we know there is analysis to do
+    import pandas as pd
+
+    if dataset == 'papers':
+        filename = "./data/all-papers.csv"
+        data = pd.read_csv(filename, encoding=encoding, dtype = {'school': str})
+        dimensions = ['venue_name', 'year', 'school', 'venue_type']
+        measure = None
+        agg = 'count'
+    elif dataset == 'collaborators':
+        filename = "./data/all-paperauths.csv"
+        data = pd.read_csv(filename, encoding=encoding)
+        dimensions = ['paperid', 'authid', "year"]
+        measure = None
+        agg = 'count'
+    else:
+        raise ValueError("Expected dataset of papers or collaborators, not", dataset)
+
+    return data, dimensions, measure, agg
+
+
 def print_top_insights(top_insights):
 
     sorted_insights = sorted(top_insights, key=lambda x:x.score, reverse=True)
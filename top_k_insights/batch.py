@@ -0,0 +1,281 @@
+import os
+import sys
+
+# Allow running this file directly as a script, as well as through the
+# top-k-insights-batch console script or `python -m top_k_insights.batch`
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from top_k_insights.insight_extractor import InsightExtractor, subspace_key
+from top_k_insights.analyze_dblp import load_dblp, print_top_insights, bar
+from top_k_insights.export import export_runs, guess_format
+
+import json
+import logging
+from datetime import datetime
+import time
+import argparse
+
+
+def main(argv=None):
+    """
+    Run a batch of top-k insight queries from a JSON config file, e.g.
+
+    {
+        "encoding": "mac_roman",
+        "export": "nightly.jsonl",
+        "jobs": [
+            {"dataset": "papers", "depth": 1, "k": 10},
+            {"dataset": "papers", "depth": 2, "k": 25},
+            {"dataset": "papers", "depth": 2, "k": 10},
+            {"dataset": "collaborators", "depth": 1, "k": 10,
+             "filters": {"year": 2015}}
+        ]
+    }
+
+    dataset is 'papers', 'collaborators' or the filename of a csv with
+    dimension columns to the left and a summed measure as the final column.
+    filters, if given, restrict the rows of the dataset to those with the
+    given dimension values before extracting insights, and the filtered
+    dimensions are left out of the search.
+    """
+    parser = argparse.ArgumentParser(description='Extract Top Insights for a batch of queries')
+    parser.add_argument('config', type=str, help="JSON file with a list of jobs")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("Expected the config to be a JSON object with a list of jobs")
+    jobs = validate_jobs(config.get('jobs'))
+    if 'export_result_sets' in config and 'export' not in config:
+        raise ValueError("export_result_sets requires export in the config")
+
+    # Check export filenames now, rather than after running every job
+    for name in ['export', 'export_result_sets']:
+        if name in config:
+            guess_format(config[name])
+
+    start = time.time()
+    os.makedirs('log', exist_ok=True)
+    log_filename = datetime.now().strftime('log/topk_batch_%m_%d_%H_%M_%S.log')
+    logging.basicConfig(level=logging.INFO, filename=log_filename)
+
+    results, timings = run_jobs(jobs,
+                                encoding=config.get('encoding'),
+                                workers=config.get('workers', 0),
+                                executor=config.get('executor', 'thread'),
+                                keep_result_sets='export_result_sets' in config)
+
+    # Print the results of each job, in the order given
+    for i, (job, top_insights) in enumerate(zip(jobs, results)):
+        print(bar)
+        print("JOB %d: %s" % (i, describe_job(job)))
+        print_top_insights(top_insights)
+
+    # Export every job at once, since parquet and arrow files are
+    # overwritten rather than appended to
+    if 'export' in config:
+        export_runs(batch_runs(jobs, results), config['export'],
+                    result_set_path=config.get('export_result_sets'))
+
+    print_timings(jobs, timings)
+
+    end = time.time()
+    print(bar)
+    print(" Finished %d jobs in %0.2f seconds" % (len(jobs), end - start))
+    print(bar)
+
+
+def batch_runs(jobs, results):
+    """
+    (run_id, top_insights, filters) tuples of each job, for export_runs.
+    """
+    batch_id = datetime.now().strftime('%m_%d_%H_%M_%S')
+    runs = []
+    for i, (job, top_insights) in enumerate(zip(jobs, results)):
+        run_id = "batch_%s_job%d_%s_d%d_k%d" % (
+            batch_id, i, os.path.basename(job['dataset']), job['depth'], job['k'])
+        runs.append((run_id, top_insights, job['filters']))
+    return runs
+
+
+def validate_jobs(jobs):
+    """
+    Check each job has a dataset, a depth of 1 or 2, a positive k and
+    filters mapping dimension names to single values, and fill in empty
+    filters. Whether the filtered dimensions exist is checked by
+    check_filters once the dataset is loaded.
+    """
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError("Expected a non-empty list of jobs in the config")
+
+    validated = []
+    for i, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValueError("Job %d should be a JSON object, not %s" % (i, job))
+        if ('dataset' not in job or job.get('depth') not in [1, 2]
+                or not isinstance(job.get('k'), int) or job['k'] < 1):
+            raise ValueError("Job %d should have a dataset, a depth of 1 or 2 and k >= 1, not %s" % (i, job))
+
+        filters = job.get('filters') or {}
+        if (not isinstance(filters, dict)
+                or not all(isinstance(value, (str, int, float)) for value in filters.values())):
+            raise ValueError("Job %d filters should map dimension names to single values, not %s" % (i, filters))
+        validated.append(dict(job, filters=filters))
+    return validated
+
+
+def check_filters(jobs, dataset, dimensions):
+    """
+    Check that the filters of every job on dataset are dimensions of it.
+    """
+    for i, job in enumerate(jobs):
+        unknown = [dim for dim in job['filters'] if dim not in dimensions]
+        if job['dataset'] == dataset and unknown:
+            raise ValueError("Job %d filters on %s, which are not dimensions of %s" % (i, unknown, dataset))
+
+
+def run_jobs(jobs, encoding=None, workers=0, executor="thread", keep_result_sets=False):
+    """
+    input:
+        jobs: list of dicts with dataset, depth, k and filters
+        remaining args: passed on to the InsightExtractor
+    output:
+        (results, timings) lists, one entry per job. results holds the
+        top insights sorted by score, and timings holds (seconds, source)
+        tuples, where source says whether the job was computed or reused.
+
+    Each dataset is loaded once, and each (dataset, filters) pair gets one
+    InsightExtractor whose impact and aggregate caches are shared by all
+    of its jobs, so depth-2 jobs reuse the aggregates of depth-1 jobs.
+    Datasets and extractors are released after their last job has run.
+    Only the largest k for each (dataset, filters, depth) is run; smaller
+    k jobs take the top of its heap, which holds the same insights.
+    """
+    # Largest k for each query, keyed by (dataset, filters, depth)
+    largest_k = {}
+    for job in jobs:
+        key = job_key(job)
+        largest_k[key] = max(largest_k.get(key, 0), job['k'])
+
+    # Run the queries one dataset and one extractor at a time, so that
+    # each can be released before the next is loaded. On each extractor,
+    # run depth 1 first, since it is cheaper and warms the caches.
+    first_seen = {}
+    for key in largest_k:
+        first_seen.setdefault(key[0], len(first_seen))
+        first_seen.setdefault(key[:2], len(first_seen))
+    run_order = sorted(largest_k, key=lambda key: (first_seen[key[0]], first_seen[key[:2]], key[2]))
+
+    # The last query run on each dataset, and on each extractor
+    last_dataset_run = {key[0]: key for key in run_order}
+    last_extractor_run = {key[:2]: key for key in run_order}
+
+    datasets = {}
+    extractors = {}
+    top_insights = {}
+    run_times = {}
+
+    for key in run_order:
+        (dataset, filters, depth) = key
+
+        if dataset not in datasets:
+            load_start = time.time()
+            datasets[dataset] = load_dataset(dataset, encoding)
+            logging.info("Loaded %s in %0.2f seconds" % (dataset, time.time() - load_start))
+            check_filters(jobs, dataset, datasets[dataset][1])
+
+        # Filtered dimensions only have one value left, so leave them out
+        # of the search rather than finding every insight twice
+        if (dataset, filters) not in extractors:
+            data, dimensions, measure, agg = datasets[dataset]
+            filtered_data = filter_data(data, dict(filters))
+            if len(filtered_data) == 0:
+                i = [job_key(job)[:2] for job in jobs].index((dataset, filters))
+                raise ValueError("Job %d filters %s match no rows of %s" % (i, dict(filters), dataset))
+
+            ie = InsightExtractor(filtered_data,
+                                  [dim for dim in dimensions if dim not in dict(filters)],
+                                  measure, agg, keep_result_sets=keep_result_sets)
+            ie.cache_aggregates = True
+            extractors[(dataset, filters)] = ie
+        ie = extractors[(dataset, filters)]
+
+        run_start = time.time()
+        heap = ie.extract_insights(depth=depth, k=largest_k[key], workers=workers, executor=executor)
+        top_insights[key] = sorted(heap, key=lambda x: x.score, reverse=True)
+        run_times[key] = time.time() - run_start
+
+        # Release the caches and data once no other query needs them
+        if last_extractor_run[(dataset, filters)] == key:
+            del extractors[(dataset, filters)]
+        if last_dataset_run[dataset] == key:
+            del datasets[dataset]
+
+    # The first job with the largest k of a query is charged its run time
+    results = []
+    timings = []
+    charged = set()
+    for job in jobs:
+        key = job_key(job)
+        results.append(top_insights[key][:job['k']])
+        if job['k'] == largest_k[key] and key not in charged:
+            charged.add(key)
+            timings.append((run_times[key], "computed"))
+        else:
+            timings.append((0.0, "from k=%d" % largest_k[key]))
+
+    return results, timings
+
+
+def job_key(job):
+    return (job['dataset'], subspace_key(job['filters']), job['depth'])
+
+
+def load_dataset(dataset, encoding=None):
+    """
+    Load a DBLP dataset by name, or any csv by filename.
+    Returns a (data, dimensions, measure, agg) tuple of InsightExtractor args.
+    """
+    if dataset in ['papers', 'collaborators']:
+        return load_dblp(dataset, encoding)
+
+    import pandas as pd
+
+    data = pd.read_csv(dataset, encoding=encoding)
+    dimensions = list(data.columns[:-1])
+    measure = data.columns[-1]
+    return data, dimensions, measure, 'sum'
+
+
+def filter_data(data, filters):
+    """
+    Only keep the rows of data with the given dimension values.
+    """
+    import pandas as pd
+
+    if not filters:
+        return data
+    return data.loc[(data[list(filters)] == pd.Series(filters, dtype=object)).all(axis=1)]
+
+
+def describe_job(job):
+    description = "%s depth=%d k=%d" % (job['dataset'], job['depth'], job['k'])
+    if job['filters']:
+        description += " filters=%s" % job['filters']
+    return description
+
+
+def print_timings(jobs, timings):
+    print(bar)
+    print("JOB TIMINGS")
+    print(bar)
+    for i, (job, (seconds, source)) in enumerate(zip(jobs, timings)):
+        line = "job %d: %0.2fs (%s) %s" % (i, seconds, source, describe_job(job))
+        logging.info(line)
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import json
+import os
+
+
+# Stable column order for exported insights and result set rows.
+# subspace, composite_extractor and dimensions are JSON-encoded strings so
+# that every run shares the same schema, whatever dimensions the dataset has.
+insight_columns = ['run_id', 'rank', 'id', 'score', 'type', 'subspace',
+                   'dimension', 'composite_extractor', 'insight', 'sigtest',
+                   'significance', 'impact']
+result_set_columns = ['run_id', 'insight_id', 'row', 'dimensions', 'M']
+
+formats = ['jsonl', 'parquet', 'arrow']
+
+
+def export_insights(top_insights, path, run_id, format=None, result_set_path=None,
+                    filters=None):
+    """
+    input:
+        top_insights: list (or min-heap) of Insight objects
+        path: filename to write the insights to
+        run_id: string identifying this run, so that exports from many
+            runs can be loaded together
+        format: one of 'jsonl', 'parquet' or 'arrow'; by default it is
+            guessed from the extension of path
+        result_set_path: optional filename to write the result set rows
+            backing each insight to, in the format guessed from its own
+            extension. Requires the insights to have been extracted with
+            keep_result_sets on.
+        filters: optional dict of dimension values the data was filtered
+            to before extracting insights. They are added back into each
+            exported subspace and result set row.
+
+    jsonl files are appended to, so one file can collect many runs.
+    parquet and arrow files are overwritten, one file per run.
+    """
+    export_runs([(run_id, top_insights, filters or {})], path, format, result_set_path)
+
+
+def export_runs(runs, path, format=None, result_set_path=None):
+    """
+    Like export_insights, but for a list of (run_id, top_insights, filters)
+    tuples, which are all written to the files at once. Use this to put
+    several runs into one parquet or arrow file.
+    """
+    format = format or guess_format(path)
+    if result_set_path is not None:
+        result_set_format = guess_format(result_set_path)
+
+    records = []
+    result_set_rows = []
+    for (run_id, top_insights, filters) in runs:
+        sorted_insights = sorted(top_insights, key=lambda x: x.score, reverse=True)
+        records += insight_records(sorted_insights, run_id, filters)
+        if result_set_path is not None:
+            result_set_rows += result_set_records(sorted_insights, run_id, filters)
+
+    write_records(records, insight_columns, path, format)
+
+    if result_set_path is not None:
+        write_records(result_set_rows, result_set_columns, result_set_path, result_set_format)
+
+
+def guess_format(path):
+    """
+    Guess the export format from a filename extension.
+    """
+    extension = os.path.splitext(path)[1].lstrip('.')
+    aliases = {'json': 'jsonl', 'ndjson': 'jsonl', 'pq': 'parquet', 'feather': 'arrow'}
+    format = aliases.get(extension, extension)
+    if format not in formats:
+        raise ValueError("Expected a .jsonl, .parquet or .arrow filename, not", path)
+    return format
+
+
+def insight_records(sorted_insights, run_id, filters=None):
+    """
+    One record per insight, ranked from the highest score down.
+    """
+    filters = filters or {}
+    records = []
+    for rank, insight in enumerate(sorted_insights, start=1):
+        record = insight.to_dict()
+        record['run_id'] = run_id
+        record['rank'] = rank
+        record['subspace'] = to_json({**filters, **record['subspace']})
+        record['composite_extractor'] = to_json(record['composite_extractor'])
+        records.append(record)
+    return records
+
+
+def result_set_records(sorted_insights, run_id, filters=None):
+    """
+    One record per row of each insight's result set.
+    """
+    filters = filters or {}
+    records = []
+    for insight in sorted_insights:
+        if insight.result_set is None:
+            raise ValueError("Insight %s has no result set; set keep_result_sets "
+                             "before extracting insights" % insight.id)
+
+        dimensions = [column for column in insight.result_set.columns if column != 'M']
+        for row, values in enumerate(insight.result_set.itertuples(index=False)):
+            values = dict(zip(insight.result_set.columns, values))
+            records.append({
+                'run_id': run_id,
+                'insight_id': insight.id,
+                'row': row,
+                'dimensions': to_json({**filters, **{dim: values[dim] for dim in dimensions}}),
+                'M': float(values['M'])})
+    return records
+
+
+def to_json(value):
+    """
+    JSON-encode a value, converting numpy scalars (such as years taken
+    from the data) to plain python values.
+    """
+    return json.dumps(value, default=lambda x: x.item())
+
+
+def write_records(records, columns, path, format):
+    """
+    Write a list of dicts to path, with columns in the given order.
+    """
+    if format == 'jsonl':
+        with open(path, 'a') as f:
+            for record in records:
+                f.write(to_json({column: record[column] for column in columns}))
+                f.write('\n')
+        return
+
+    # pyarrow is only needed for the columnar formats
+    try:
+        import pyarrow as pa
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required to export %s files; "
+                          "install it with `pip install pyarrow`" % format)
+
+    types = {
+        'run_id': pa.string(),
+        'rank': pa.int64(),
+        'id': pa.int64(),
+        'score': pa.float64(),
+        'type': pa.string(),
+        'subspace': pa.string(),
+        'dimension': pa.string(),
+        'composite_extractor': pa.string(),
+        'insight': pa.string(),
+        'sigtest': pa.string(),
+        'significance': pa.float64(),
+        'impact': pa.float64(),
+        'insight_id': pa.int64(),
+        'row': pa.int64(),
+        'dimensions': pa.string(),
+        'M': pa.float64()}
+
+    schema = pa.schema([(column, types[column]) for column in columns])
+    table = pa.Table.from_pylist(records, schema=schema)
+    if format == 'parquet':
+        pyarrow.parquet.write_table(table, path)
+    else:
+        pyarrow.feather.write_feather(table, path)
@@ -1,13 +1,19 @@
-import pandas as pd
 import logging
 import heapq
+import queue
+import threading
+from collections import deque
 
-import significance_tests as st
+from top_k_insights import significance_tests as st
+
+# pandas and concurrent.futures are imported where they are used rather than
+# here, so that the command-line program can parse its arguments without
+# loading them.
 
 
 class InsightExtractor:
 
-    def __init__(self, data, dimensions, measure, agg):
+    def __init__(self, data, dimensions, measure, agg, keep_result_sets=False):
         """
         input:
             data: pandas dataframe
@@ -15,6 +21,7 @@ class InsightExtractor:
             measure: string measure name
             agg: string of the level-1 aggregation function
                 to apply (one of: [sum, count]), default "sum"
+            keep_result_sets: keep the result set backing each insight
         """
         self.data = data.fillna('')
         self.dimensions = dimensions
@@ -39,18 +46,47 @@ class InsightExtractor:
         # Starting Insight id, unique for each insight found
         self.iid = 1001
 
+        # Work queue of result sets awaiting significance tests. This is
+        # only set while extracting insights with parallel workers; otherwise
+        # result sets are tested as soon as they are extracted.
+        self.work_queue = None
+
+        # Set when the consumer of the work queue stops, so that the
+        # enumeration thread stops early too instead of finishing the search
+        self.stop_event = threading.Event()
+
+        # Keep the result set backing each insight, so that it can be
+        # exported along with the top insights. Off by default since
+        # it holds a DataFrame for every insight in the heap.
+        self.keep_result_sets = keep_result_sets
+
+        # Caches of subspace impacts, and of first-level aggregates keyed by
+        # subspace and grouping dimensions. Impacts are small and always
+        # cached; aggregates can be large, so only cache them when asked to,
+        # e.g. when running several queries over the same data.
+        self.impact_cache = {}
+        self.aggregate_cache = {}
+        self.cache_aggregates = False
+
+        # Guards the top insights heap, which the enumeration thread reads
+        # for pruning while the consumer is updating it
+        self.heap_lock = threading.Lock()
+
     @classmethod
     def fromfilename(cls, filename, agg):
         """
         Datasets should be csvs formatted with dimension columns to the left
         and measure as the final column. The first row should be a header.
         """
+        import pandas as pd
+
         data = pd.read_csv(filename, encoding='mac_roman')
         measure = data.columns[-1]
         dimensions = data.columns[:-1]
         return cls(data, measure, dimensions, agg)
 
-    def extract_insights(self, depth, k):
+    def extract_insights(self, depth, k, workers=0, executor="thread",
+                         batch_size=16, queue_size=64):
         """
         Algorithm 1: Extract Insights
 
@@ -61,6 +97,12 @@ class InsightExtractor:
                 initialize subspace
                 enumerate_insight(subspace, dimension, composite extractor)
         return min-heap
+
+        With workers > 0, enumeration runs on its own thread and produces
+        result sets into a bounded queue of queue_size items. The calling
+        thread consumes the queue, sends batches of batch_size result sets to
+        a pool of workers ("thread" or "process" executor) for significance
+        testing, and is the only thread that updates the min-heap.
         """
 
         # Reset analysis attributes
@@ -79,14 +121,125 @@ class InsightExtractor:
         else:
             raise ValueError("Expected depth of 1 or 2, not", depth)
 
-        # Enumerate sibling groups, extracting insights for each.
+        if workers > 0:
+            self.pipeline_insights(composite_extractors, workers, executor,
+                                   batch_size, queue_size)
+        else:
+            self.enumerate_all(composite_extractors)
+
+        return self.top_insights
+
+    def enumerate_all(self, composite_extractors):
+        """
+        Enumerate sibling groups, extracting insights for each.
+        """
         # Start with the subspace of the whole datsaet
         subspace = {}
         for composite_extractor in composite_extractors:
             for dimension in self.dimensions:
                 self.enumerate_insight(subspace.copy(), dimension, composite_extractor)
 
-        return self.top_insights
+    def pipeline_insights(self, composite_extractors, workers, executor,
+                          batch_size, queue_size):
+        """
+        Producer/consumer version of enumerate_all.
+
+        producer thread: enumerate_all, putting work items into work_queue
+        consumer (this thread):
+            collect work items into batches
+            submit each batch to the worker pool
+            add tested insights to the min-heap, oldest batch first
+
+        The bounded work queue blocks the producer when the consumer falls
+        behind, and at most 2 batches per worker are in flight at once,
+        so memory stays bounded no matter how many sibling groups there are.
+        """
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+        import multiprocessing
+
+        if executor == "thread":
+            pool = ThreadPoolExecutor(max_workers=workers)
+        elif executor == "process":
+            # Spawn rather than fork the workers: they start at the first
+            # submit, while the producer thread is already running
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        else:
+            raise ValueError("Expected executor of thread or process, not", executor)
+
+        self.work_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event.clear()
+        done = object()
+        errors = []
+
+        def produce():
+            try:
+                self.enumerate_all(composite_extractors)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                self.put_work(done)
+
+        producer = threading.Thread(target=produce, name="enumerate_insights")
+        producer.start()
+
+        try:
+            with pool:
+                try:
+                    self.consume_work(pool, workers, batch_size, done)
+                finally:
+                    # Tell the producer to stop, in case the consumer
+                    # failed part way through (e.g. a worker raised)
+                    self.stop_event.set()
+        finally:
+            producer.join()
+            self.work_queue = None
+            self.stop_event.clear()
+
+        if errors:
+            raise errors[0]
+
+    def consume_work(self, pool, workers, batch_size, done):
+        """
+        Consumer loop of pipeline_insights, run until the producer puts done.
+        """
+        pending = deque()
+        batch = []
+        while True:
+            item = self.work_queue.get()
+            if item is not done:
+                batch.append(item)
+
+            # Submit full batches, plus the final partial batch
+            if batch and (len(batch) >= batch_size or item is done):
+                pending.append((batch, pool.submit(run_test_batch, batch, self.depth)))
+                batch = []
+
+            # Back-pressure: wait on the oldest batch before taking
+            # more work once the pool is saturated. Batches are handled
+            # in submission order, so insights are added to the heap in
+            # the order they were enumerated. Ids can still differ from a
+            # serial run, since the producer prunes against a heap that
+            # may not have caught up yet.
+            while pending and (len(pending) >= 2 * workers or item is done):
+                tested_batch, future = pending.popleft()
+                for work_item, results in zip(tested_batch, future.result()):
+                    self.add_tested_insights(*work_item, results)
+
+            if item is done:
+                break
+
+    def put_work(self, item):
+        """
+        Put an item on the work queue, waiting while it is full, unless the
+        consumer has stopped.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.work_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
 
     def enumerate_insight(self, subspace, dimension, composite_extractor):
         """
@@ -97,6 +250,10 @@ class InsightExtractor:
             for each insight type:
                 score = impact(subspace, dimension) * significance(result_set)
         """
+        # Stop enumerating once the consumer of a pipelined search has stopped
+        if self.stop_event.is_set():
+            return
+
         print("enumerate_insight(%s, %s, %s)" % (subspace, dimension, composite_extractor))
         logging.info("enumerate_insight(%s, %s, %s)" % (subspace, dimension, composite_extractor))
 
@@ -105,8 +262,7 @@ class InsightExtractor:
         # exceeds the score of the top kth insight, since this is an upper
         # bound on the insight score. All child subspaces can also be skipped.
         impact = self.impact(subspace, dimension)
-        if impact <= self.cutoff or (len(self.top_insights) == self.k
-                                     and impact <= self.top_insights[0].score):
+        if impact <= self.cutoff or impact <= self.kth_score():
             logging.info("Skipping low impact subspace ( %0.2fpct ) - %s" % (impact*100, subspace))
             return
 
@@ -130,35 +286,14 @@ class InsightExtractor:
                 logging.info("RESULT SET:\n %s" % result_set.head(30))
                 logging.info("(%s rows)" % len(result_set))
 
-                # Enumerate over each insight type
-                for insight_type in ["point", "shape"]:
-
-                    # Skip shape insights unless we have an ordinal dimension
-                    if insight_type == "shape" and dimension != "year":
-                        continue
-
-                    # Lookup which significance test to use
-                    # This depends on the insight type, dimension,
-                    # and which extractors are used
-                    sigtest = st.get_distribution(insight_type, dimension, self.depth, composite_extractor)
-                    insight, significance_score = sigtest(result_set)
-                    insight_score = impact * significance_score
-                    logging.info("  *  Tested using %s - sig={%0.2f}, impact={%0.2f}, score={%0.2f}" % (sigtest.__name__, significance_score, impact, insight_score))
-
-                    # Generate a new insight with info needed to interpret it
-                    new_insight = Insight(self.iid, insight, insight_score, subspace.copy(), dimension, composite_extractor, insight_type, significance_score, sigtest.__name__, impact)
-                    self.iid += 1
-                    logging.info("INSIGHT FOUND: {}".format(new_insight.interpretation()))
-                    print("INSIGHT FOUND: {}".format(new_insight.interpretation()))
-
-                    # Update the minheap if the insight has a top k score
-                    if len(self.top_insights) < self.k:
-                        heapq.heappush(self.top_insights, new_insight)
-                        logging.info("added insight: %s" % new_insight)
-                    else:
-                        if new_insight.score > self.top_insights[0]:
-                            logging.info("added insight: %s" % new_insight)
-                        heapq.heappushpop(self.top_insights, new_insight)
+                # Hand the result set off to the significance test workers,
+                # or test it right away when running on a single thread
+                work_item = (subspace.copy(), dimension, composite_extractor, impact, result_set)
+                if self.work_queue is not None:
+                    self.put_work(work_item)
+                else:
+                    results = st.run_tests(result_set, dimension, self.depth, composite_extractor)
+                    self.add_tested_insights(*work_item, results)
 
         # Since certian  dimensions have zero or only one sizeable unique val,
         # don't enumerate over the child subspaces of the infrequent values.
@@ -181,6 +316,49 @@ class InsightExtractor:
                 self.enumerate_insight(child_subspace, new_dimension, composite_extractor)
 
 
+    def kth_score(self):
+        """
+        The score of the top kth insight, or 0.0 if fewer than k insights
+        have been found so far.
+        """
+        with self.heap_lock:
+            if len(self.top_insights) == self.k:
+                return self.top_insights[0].score
+            return 0.0
+
+    def add_tested_insights(self, subspace, dimension, composite_extractor, impact,
+                            result_set, results):
+        """
+        Build an Insight for each significance test result of a sibling
+        group, and add it to the min-heap if it has a top k score.
+        """
+        # Only keep the dimension and measure columns of the result set;
+        # significance tests may have added scratch columns such as 'err'
+        if self.keep_result_sets:
+            result_set = result_set[[dim for dim in self.dimensions if dim in result_set.columns] + ['M']]
+        else:
+            result_set = None
+
+        for (insight_type, sigtest, insight, significance_score) in results:
+            insight_score = impact * significance_score
+            logging.info("  *  Tested using %s - sig={%0.2f}, impact={%0.2f}, score={%0.2f}" % (sigtest, significance_score, impact, insight_score))
+
+            # Generate a new insight with info needed to interpret it
+            new_insight = Insight(self.iid, insight, insight_score, subspace.copy(), dimension, composite_extractor, insight_type, significance_score, sigtest, impact, result_set)
+            self.iid += 1
+            logging.info("INSIGHT FOUND: {}".format(new_insight.interpretation()))
+            print("INSIGHT FOUND: {}".format(new_insight.interpretation()))
+
+            # Update the minheap if the insight has a top k score
+            with self.heap_lock:
+                if len(self.top_insights) < self.k:
+                    heapq.heappush(self.top_insights, new_insight)
+                    logging.info("added insight: %s" % new_insight)
+                else:
+                    if new_insight.score > self.top_insights[0]:
+                        logging.info("added insight: %s" % new_insight)
+                    heapq.heappushpop(self.top_insights, new_insight)
+
     def extract_result_set(self, subspace, dividing_dimension, composite_extractor):
         """
         Algorithm 2: Build a result set
@@ -193,14 +371,15 @@ class InsightExtractor:
 
         unique_vals = self.data[dimension].unique()
         """
+        import pandas as pd
+
         logging.info("extract_result_set(%s, %s, %s" % (subspace, dividing_dimension, composite_extractor))
 
         # Since we only handle depth 1 or 2, I just handle those two cases
         # separately rather than recursively.
         if self.depth == 1:
 
-            subset = self.data.loc[(self.data[list(subspace)] == pd.Series(subspace, dtype=object)).all(axis=1)]
-            result_set = subset.groupby(dividing_dimension).agg({self.measure:'sum'}).rename(columns={self.measure:'M'})
+            result_set = self.aggregate(subspace, [dividing_dimension]).rename(columns={self.measure:'M'})
 
             # Add dimension information back into the result set
             result_set = result_set.reset_index(drop=False)
@@ -221,7 +400,9 @@ class InsightExtractor:
         # extractor over agg(sum) (e.g. rank, delta_prev, pct, delta_avg).
         (extractor, analysis_dimension) = composite_extractor[1]
         if analysis_dimension == dividing_dimension:
-            subset = self.data.loc[(self.data[list(subspace)] == pd.Series(subspace, dtype=object)).all(axis=1)]
+
+            # First level of aggregation: sum of the original measure
+            result_set = self.aggregate(subspace, [dividing_dimension])
 
             # Ensure that delta_prev subset includes previous year even when the
             # subspace excludes it; we need the prev year to be able to
@@ -230,10 +411,8 @@ class InsightExtractor:
             if extractor == 'delta_prev' and 'year' in subspace:
                 previous_year_subspace = subspace.copy()
                 previous_year_subspace['year'] -= 1
-                subset = subset.append(self.data.loc[(self.data[list(previous_year_subspace)] == pd.Series(previous_year_subspace, dtype=object)).all(axis=1)])
-
-            # First level of aggregation: sum of the original measure
-            result_set = subset.groupby(dividing_dimension).agg({self.measure:'sum'})
+                result_set = pd.concat([result_set, self.aggregate(previous_year_subspace, [dividing_dimension])])
+                result_set = result_set.groupby(level=0).sum()
 
             # Add dimension information back into the result set
             result_set = result_set.reset_index(drop=False)
@@ -270,10 +449,8 @@ class InsightExtractor:
             temp_subspace = subspace.copy()
             del temp_subspace[analysis_dimension]
 
-            subset = self.data.loc[(self.data[list(temp_subspace)] == pd.Series(temp_subspace, dtype=object)).all(axis=1)]
-
             # First level of aggregation: sum of the original measure
-            result_set = subset.groupby([dividing_dimension, analysis_dimension]).agg({self.measure:'sum'})
+            result_set = self.aggregate(temp_subspace, [dividing_dimension, analysis_dimension])
 
             # Add dimension information back into the result set
             result_set = result_set.reset_index(drop=False)
@@ -285,11 +462,11 @@ class InsightExtractor:
             if extractor == 'rank':
                 result_set['M'] = result_set.groupby(dividing_dimension)[self.measure].rank(ascending=False, method='first')
             elif extractor == 'pct':
-                group_sum = result_set.rename(columns={self.measure:'M'}).groupby(dividing_dimension).sum()['M']
+                group_sum = result_set.rename(columns={self.measure:'M'}).groupby(dividing_dimension)['M'].sum()
                 result_set = result_set.merge(group_sum, on=dividing_dimension)
                 result_set['M'] = 100 * result_set[self.measure] / result_set['M']
             elif extractor == 'delta_avg':
-                group_avg = result_set.rename(columns={self.measure:'M'}).groupby(dividing_dimension).mean()['M']
+                group_avg = result_set.rename(columns={self.measure:'M'}).groupby(dividing_dimension)['M'].mean()
                 result_set = result_set.merge(group_avg, on=dividing_dimension)
                 result_set['M'] = result_set[self.measure] - result_set['M']
             elif extractor == 'delta_prev':
@@ -307,6 +484,32 @@ class InsightExtractor:
             return result_set[result_set['M'].notnull()]
 
 
+    def aggregate(self, subspace, group_dimensions):
+        """
+        First level of aggregation: sum of the measure over the subspace,
+        grouped by group_dimensions.
+
+        These aggregates are the same for every depth and composite
+        extractor; e.g. a depth-1 result set is the aggregate that case 1
+        of a depth-2 result set starts from. When cache_aggregates is on,
+        aggregates over a single dimension are kept and reused, including
+        across extract_insights calls. Aggregates over two dimensions are
+        only used by case 2 of depth 2, so they are not worth keeping.
+        Callers must not modify the returned DataFrame in place.
+        """
+        import pandas as pd
+
+        key = (subspace_key(subspace), tuple(group_dimensions))
+        if key in self.aggregate_cache:
+            return self.aggregate_cache[key]
+
+        subset = self.data.loc[(self.data[list(subspace)] == pd.Series(subspace, dtype=object)).all(axis=1)]
+        aggregate = subset.groupby(list(group_dimensions)).agg({self.measure:'sum'})
+
+        if self.cache_aggregates and len(group_dimensions) == 1:
+            self.aggregate_cache[key] = aggregate
+        return aggregate
+
     def is_valid(self, subspace, dimension, composite_extractor):
         """
         A composite extractor is invalid iff pct is not the first extractor used.
@@ -333,7 +536,16 @@ class InsightExtractor:
         """
         The impact score is the market share of the subspace S.
         """
+        import pandas as pd
+
         logging.info("impact(%s, %s)" % (subspace, dimension))
+
+        # The impact only depends on the subspace, which is enumerated once
+        # for each of its dividing dimensions, so cache it
+        key = subspace_key(subspace)
+        if key in self.impact_cache:
+            return self.impact_cache[key]
+
         subset = self.data.loc[(self.data[list(subspace)] == pd.Series(subspace, dtype=object)).all(axis=1)]
 
         numerator = subset[self.measure].sum()
@@ -342,16 +554,33 @@ class InsightExtractor:
         impact_score = float(numerator / denominator)
         assert(0.0 <= impact_score <= 1.0)
 
+        self.impact_cache[key] = impact_score
         return impact_score
 
 
+def subspace_key(subspace):
+    """
+    A hashable key for a subspace dict, independent of insertion order.
+    """
+    return tuple(sorted(subspace.items()))
+
+
+def run_test_batch(batch, depth):
+    """
+    Run the significance tests for a batch of work items, each a tuple of
+    (subspace, dimension, composite_extractor, impact, result_set).
+    Returns a list with the run_tests results for each work item.
+    """
+    return [st.run_tests(result_set, dimension, depth, composite_extractor)
+            for (subspace, dimension, composite_extractor, impact, result_set) in batch]
+
 
 class Insight:
 
     csv_header = "id;score;type;SG(S,D);CE;insight;H0;sig;impact"
 
     def __init__(self, id, insight, score, subspace, dimension, composite_extractor,
-                 insight_type, significance, sigtest, impact):
+                 insight_type, significance, sigtest, impact, result_set=None):
         self.id = id
         self.insight = insight
         self.score = score
@@ -362,6 +591,7 @@ class Insight:
         self.significance = significance
         self.sigtest = sigtest
         self.impact = impact
+        self.result_set = result_set
 
     def __lt__(self, other):
         return self.score < other
@@ -390,6 +620,22 @@ class Insight:
                     sigtest=self.sigtest,
                     subspace=self.subspace)
 
+    def to_dict(self):
+        """
+        The insight as a dict of plain values, without its result set.
+        """
+        return {
+            'id': self.id,
+            'score': self.score,
+            'type': self.insight_type,
+            'subspace': self.subspace,
+            'dimension': self.dimension,
+            'composite_extractor': self.composite_extractor,
+            'insight': self.insight,
+            'sigtest': self.sigtest,
+            'significance': self.significance,
+            'impact': self.impact}
+
     def to_csv(self):
         return "%s;%s;%s;%s;%s;%s;%s;%s;%s" % (
             self.id,
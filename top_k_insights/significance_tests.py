@@ -1,6 +1,6 @@
-import numpy as np
-import scipy
-import scipy.stats
+# numpy and scipy are imported inside the significance tests rather than
+# here, so that importing this module (e.g. for the command-line --help)
+# does not pay for loading scipy.stats.
 
 
 def get_distribution(insight_type, dimension, depth, composite_extractor):
@@ -45,6 +45,38 @@ def get_distribution(insight_type, dimension, depth, composite_extractor):
     return extractor_to_sigtest[extractor]
 
 
+def run_tests(result_set, dimension, depth, composite_extractor):
+    """
+    input:
+        result_set: a DataFrame result set with measure column 'M'
+        dimension: string name of the dividing dimension
+        depth: integer depth of the composite extractor (1 or 2)
+        composite_extractor: list of (extractor, dimension) tuples
+    output:
+        list of (insight_type, sigtest name, insight, significance score)
+        tuples, one for each insight type tested on the result set
+
+    Shape insights are only tested when the dividing dimension is ordinal.
+    This is a module-level function so that it can be sent to worker
+    processes as well as worker threads.
+    """
+    results = []
+    for insight_type in ["point", "shape"]:
+
+        # Skip shape insights unless we have an ordinal dimension
+        if insight_type == "shape" and dimension != "year":
+            continue
+
+        # Lookup which significance test to use
+        # This depends on the insight type, dimension,
+        # and which extractors are used
+        sigtest = get_distribution(insight_type, dimension, depth, composite_extractor)
+        insight, significance_score = sigtest(result_set)
+        results.append((insight_type, sigtest.__name__, insight, significance_score))
+
+    return results
+
+
 def powerlaw(rs):
     """
     input:
@@ -60,6 +92,9 @@ def powerlaw(rs):
     A maximum value is significant based on the p value of the error between
     the max value and the predicted max value of the best fit powerlaw dist.
     """
+    import numpy as np
+    import scipy.stats
+
     # Sanity checks:
     assert all(rs['M'] > 0), "powerlaw is only valid for positive distributions"
 
@@ -114,6 +149,8 @@ def normal(rs):
     if pval(x_max)/alpha > 1, the point is certainly not significant;
     so, report a significance of 0.
     """
+    import scipy.stats
+
     # x_max
     x_max = rs['M'].max()
     x_len = len(rs)
@@ -148,6 +185,8 @@ def linear_shape(rs):
     the dividing dimension is ordinal. For example, when the
     sibling group uses "year" as its dividing dimension.
     """
+    import scipy.stats
+
     assert("year" in rs.columns and "M" in rs.columns)
     slope, intercept, r, p, stderr = scipy.stats.linregress(rs['year'], rs['M'])
 
@@ -166,6 +205,8 @@ def linear_point(rs):
     output: a tuple (string, float) of the insight found to be significant,
             and the p value indicating how significant the insight is.
     """
+    import scipy.stats
+
     assert("year" in rs.columns and "M" in rs.columns)
     slope, intercept, r, p, stderr = scipy.stats.linregress(rs['year'], rs['M'])
 